@@ -1,22 +1,42 @@
 from flask import Flask, render_template, send_file, jsonify, Response, stream_with_context, request
 import boto3
+import cachetools
 from dotenv import load_dotenv
 import os
+import shutil
+import tempfile
 from io import BytesIO
-from collections import defaultdict
+from urllib.parse import quote
+from html import escape
+import unicodedata
+from werkzeug.http import dump_options_header
 import zipfile
 import logging
 import json
 import threading
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing
+from itertools import islice
+
+# orjson is much faster for the per-file SSE frames; fall back to the stdlib encoder
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    dumps = json.dumps
+
+load_dotenv()
 
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-load_dotenv()
 logger.info("Environment variables loaded")
 
 endpoint = os.getenv("ENDPOINT_URL")
@@ -24,6 +44,7 @@ bucket = os.getenv("BUCKET_NAME")
 key = os.getenv("ACCESS_KEY")
 secret = os.getenv("SECRET_KEY")
 title = os.getenv("APP_TITLE", "Bkash MINIO Browser")
+download_workers = int(os.getenv("DOWNLOAD_WORKERS", "16"))
 
 logger.info(f"Connecting to S3 - Endpoint: {endpoint}, Bucket: {bucket}")
 
@@ -32,125 +53,414 @@ s3 = boto3.client(
     aws_access_key_id=key,
     aws_secret_access_key=secret,
     endpoint_url=endpoint,
-    config=boto3.session.Config(s3={"addressing_style": "path"})
+    config=boto3.session.Config(
+        s3={"addressing_style": "path"},
+        tcp_keepalive=True,
+        # Leave room for every download worker, otherwise they queue on the default 10-slot pool
+        max_pool_connections=max(32, download_workers * 2)
+    )
 )
 
 app = Flask(__name__)
 
-# Global dictionary to track download tasks
-download_tasks = {}
+# Shared thread pool for fetching objects concurrently during folder downloads
+download_executor = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="s3-fetch")
+logger.info(f"Download executor started with {download_workers} workers")
+# Fetches kept in flight ahead of the zip writer; bounds how many spooled bodies wait at once
+PREFETCH_DEPTH = download_workers * 2
+
+# Object bodies are spooled in memory up to this size, then overflow to disk
+OBJECT_SPOOL_SIZE = 1 << 20
+# Zip archives are kept in memory up to this size, then overflow to disk
+ZIP_SPOOL_SIZE = 64 << 20
+COPY_CHUNK_SIZE = 1 << 20
+# Send a folder download progress frame every N files (plus the last one)
+PROGRESS_EVERY = 10
+
+# Already-compressed formats are stored as-is; everything else is deflated at the fastest level
+_INCOMPRESSIBLE = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.webm',
+    '.zip', '.gz', '.bz2', '.xz', '.zst', '.7z', '.rar'
+}
+ZIP_COMPRESSLEVEL = 1
+
+# Seconds a finished or cancelled download task is kept before the janitor drops it
+TASK_EXPIRY_SECONDS = 60
+JANITOR_INTERVAL = 5
+# Hard bounds on finished (unserved) download tasks, so abandoned zips cannot pile up
+TASK_CACHE_SIZE = 128
+TASK_TTL = 600
+
+def release_task(task_id, task):
+    """Close a dropped task's zip buffer so its spooled temp file is reclaimed"""
+    if task.get('zip_buffer'):
+        task['zip_buffer'].close()
+    logger.info(f"[{task_id}] Task cleaned up")
+
+class DownloadTaskCache(cachetools.TTLCache):
+    """TTLCache of download tasks that releases zip buffers when entries expire or are evicted"""
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for task_id, task in expired:
+            release_task(task_id, task)
+        return expired
+
+    def popitem(self):
+        task_id, task = super().popitem()
+        release_task(task_id, task)
+        return task_id, task
+
+# Tasks whose zip is still being built; never evicted, so they stay cancellable however long they run
+active_tasks = {}
+# Finished tasks holding zip buffers; all access to both goes through download_tasks_lock
+download_tasks = DownloadTaskCache(maxsize=TASK_CACHE_SIZE, ttl=TASK_TTL)
+download_tasks_lock = threading.RLock()
+
+# Folder info results, reused for a short time to avoid re-listing on repeated clicks
+folder_info_cache = cachetools.TTLCache(maxsize=1024, ttl=30)
+# Completed in-memory zips keyed by folder prefix, bounded by total bytes and validated by listing token
+ZIP_CACHE_SIZE = 256 << 20
+zip_cache = cachetools.LRUCache(maxsize=ZIP_CACHE_SIZE, getsizeof=lambda entry: len(entry['data']))
+folder_cache_lock = threading.Lock()
+
+# Last fully rendered bucket tree, reused as-is for TREE_CACHE_TTL seconds. This is a plain TTL cache:
+# S3 has no cheap whole-bucket version, so uploads/deletes show up once the entry expires
+_INDEX_CACHE = {'html': None, 'count': 0, 'page': 0, 'ts': 0, 'build': None}
+_CACHE_TTL = int(os.getenv("TREE_CACHE_TTL", "15"))
+# Guards _INDEX_CACHE; never held while yielding to a client
+_INDEX_CACHE_LOCK = threading.Lock()
+
 
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
 
+@lru_cache(maxsize=4096)
 def format_size(size_bytes):
     """Convert bytes to human-readable format"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} PB"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    # Size classes are powers of 1024, so the unit index falls out of the bit length
+    i = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (i * 10)):.2f} {_SIZE_UNITS[i]}"
+
+def fetch_object(key, stop=None):
+    """Fetch a single object from S3 into a spooled temp file (runs on the download executor)
+
+    If stop is set mid-transfer, the S3 body is closed and the partial spool discarded.
+    """
+    if stop is not None and stop.is_set():
+        raise RuntimeError(f"Fetch of {key} cancelled")
+    file_obj = s3.get_object(Bucket=bucket, Key=key)
+    body = file_obj['Body']
+    spool = tempfile.SpooledTemporaryFile(max_size=OBJECT_SPOOL_SIZE)
+    try:
+        with body:
+            for chunk in body.iter_chunks(chunk_size=COPY_CHUNK_SIZE):
+                if stop is not None and stop.is_set():
+                    raise RuntimeError(f"Fetch of {key} cancelled")
+                spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def content_disposition(filename):
+    """Attachment header with an ASCII filename= fallback plus RFC 5987 filename* (as send_file emits)"""
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    options = {'filename': ascii_name}
+    if ascii_name != filename:
+        options['filename*'] = f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"
+    return dump_options_header('attachment', options)
+
+def list_objects(prefix=""):
+    """List every object under prefix, following pagination"""
+    paginator = s3.get_paginator('list_objects_v2')
+    objects = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={'PageSize': 1000}):
+        objects.extend(page.get('Contents', ()))
+    return objects
+
+def listing_token(objects):
+    """Version token for a listing; changes whenever a key, ETag or size changes"""
+    return hash(tuple((obj['Key'], obj.get('ETag'), obj['Size']) for obj in objects))
+
+def open_zip(zip_buffer):
+    """Open a zip archive for writing, deflating entries by default"""
+    return zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSLEVEL, allowZip64=True)
+
+def discard_fetch(future):
+    """Close the spool of a fetch that will never be consumed"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+def fetch_objects(keys):
+    """Yield (key, future) as objects finish fetching, keeping at most PREFETCH_DEPTH fetches in flight"""
+    keys = iter(keys)
+    stop = threading.Event()
+    pending = {download_executor.submit(fetch_object, key, stop): key for key in islice(keys, PREFETCH_DEPTH)}
+    done = set()
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            while done:
+                future = done.pop()
+                key = pending.pop(future)
+                # Start the next fetch before handing this one over, so fetching overlaps zip writing
+                for next_key in islice(keys, 1):
+                    pending[download_executor.submit(fetch_object, next_key, stop)] = next_key
+                yield key, future
+    finally:
+        # Cancellation, client disconnect or error: abort running copies and drop queued fetches
+        stop.set()
+        for future in pending:
+            future.cancel()
+        # Close spools of fetches never handed over, including ones that finish after stop
+        for future in done | pending.keys():
+            future.add_done_callback(discard_fetch)
+
+def zip_entry_info(zip_file, relative_path):
+    """Build the ZipInfo that ZipFile.writestr would use: current time, archive compression, file/dir attributes"""
+    zinfo = zipfile.ZipInfo(relative_path, date_time=time.localtime()[:6])
+    zinfo.compress_type = zip_file.compression
+    zinfo._compresslevel = zip_file.compresslevel
+    if relative_path.endswith('/'):
+        zinfo.external_attr = 0o40775 << 16  # drwxrwxr-x
+        zinfo.external_attr |= 0x10  # MS-DOS directory flag
+    else:
+        zinfo.external_attr = 0o600 << 16  # ?rw-------
+    return zinfo
+
+def write_zip_entry(zip_file, relative_path, spool):
+    """Stream a fetched object into the zip archive, returning the uncompressed size"""
+    target = zip_entry_info(zip_file, relative_path)
+    if os.path.splitext(relative_path)[1].lower() in _INCOMPRESSIBLE:
+        # Skip the deflate pass for data that will not shrink
+        target.compress_type = zipfile.ZIP_STORED
+        target._compresslevel = None
+    
+    with spool, zip_file.open(target, 'w', force_zip64=True) as entry:
+        shutil.copyfileobj(spool, entry, COPY_CHUNK_SIZE)
+        return spool.tell()
 
 def build_tree(objects):
     """Build a hierarchical tree structure from flat object keys with sizes"""
     logger.info(f"Building tree structure for {len(objects)} objects")
-    tree = defaultdict(lambda: {"files": [], "folders": defaultdict(dict)})
-    
+    tree = {"files": [], "folders": {}}
+    add_to_tree(tree, objects)
+    sort_tree(tree)
+    logger.info("Tree structure built successfully")
+    return tree
+
+def add_to_tree(tree, objects):
+    """Insert objects into an existing tree (call sort_tree before rendering)"""
     for obj in objects:
         obj_key = obj['Key']
-        obj_size = obj['Size']
-        logger.debug(f"Processing object: {obj_key} (size: {format_size(obj_size)})")
+        logger.debug("Processing object: %s (size: %s bytes)", obj_key, obj['Size'])
         parts = obj_key.split('/')
-        current = tree
-        
-        # Navigate through folders
-        for i, part in enumerate(parts[:-1]):
-            if part not in current:
-                current[part] = {"files": [], "folders": {}}
-            current = current[part]["folders"]
-        
-        # Add file to the current level
-        if parts[-1]:  # Not empty (trailing slash case)
-            parent_path = '/'.join(parts[:-1]) if len(parts) > 1 else ''
-            if len(parts) > 1:
-                current = tree
-                for part in parts[:-2]:
-                    current = current[part]["folders"]
-                if parts[-2] not in current:
-                    current[parts[-2]] = {"files": [], "folders": {}}
-                current[parts[-2]]["files"].append({'key': obj_key, 'size': obj_size})
-            else:
-                tree["_root_files"] = tree.get("_root_files", {"files": [], "folders": {}})
-                tree["_root_files"]["files"].append({'key': obj_key, 'size': obj_size})
-    
-    logger.info("Tree structure built successfully")
-    return tree
+        
+        # Walk (and create) the folder path in a single pass
+        node = tree
+        for part in parts[:-1]:
+            node = node["folders"].setdefault(part, {"files": [], "folders": {}})
+        
+        # Add file to its folder (empty leaf means a folder marker with a trailing slash)
+        if parts[-1]:
+            node["files"].append({'key': obj_key, 'size': obj['Size'], 'name': parts[-1]})
 
-def render_tree(tree, prefix="", level=0, parent_path=""):
-    """Recursively render the tree structure as HTML"""
-    logger.debug(f"Rendering tree at level {level}, path: {parent_path}")
-    html = "<ul>"
+def sort_tree(node):
+    """Sort files by key and folders by name at every level so rendering can iterate in order"""
+    node["files"].sort(key=lambda x: x['key'])
+    node["folders"] = {name: node["folders"][name] for name in sorted(node["folders"])}
+    for child in node["folders"].values():
+        sort_tree(child)
+
+# Precomputed HTML fragments for render_tree; every value is escaped before formatting
+_FILE_TMPL = '<li class="file"><a href="/download/{k}">{n}</a><span class="file-size">({s})</span></li>'
+_FOLDER_OPEN_TMPL = (
+    '<li class="folder">'
+    '<div class="folder-header">'
+    '<span class="folder-name" onclick="toggleFolder({fid_js})">{fn}</span>'
+    '<div class="three-dot-menu">'
+    '<button class="three-dot-btn" onclick="toggleDropdown({did_js}, event)">⋮</button>'
+    '<div id="{did}" class="dropdown-menu">'
+    '<a class="dropdown-item" onclick="downloadFolder({fp_js}, event)">📥 Download</a>'
+    '<a class="dropdown-item" onclick="showFolderInfo({fp_js}, event)">ℹ️ Info</a>'
+    '</div>'
+    '</div>'
+    '</div>'
+    '<div id="{fid}" class="collapsible">'
+)
+_FOLDER_CLOSE = '</div></li>'
+# Characters replaced in generated element IDs, applied in a single str.translate call
+_ID_TRANS = str.maketrans({'/': '_', ' ': '_'})
+
+def js_arg(value):
+    """Encode a value as a JS string literal that is safe inside an HTML attribute"""
+    return escape(json.dumps(value))
+
+def render_file(file_obj):
+    """Render a single file entry as HTML"""
+    return _FILE_TMPL.format(
+        k=quote(file_obj['key']),
+        n=escape(file_obj['name']),
+        s=format_size(file_obj['size'])
+    )
+
+def render_tree(tree):
+    """Render the tree structure as HTML"""
+    out = []
+    _render_tree(tree["folders"], out, files=tree["files"])
+    return ''.join(out)
+
+def _render_tree(folders, out, prefix="", level=0, parent_path="", files=()):
+    """Recursively render the folders (plus any files at the same level) as HTML fragments appended to out"""
+    logger.debug("Rendering tree at level %d, path: %s", level, parent_path)
+    out.append("<ul>")
     
     # Handle root files
-    if "_root_files" in tree:
-        logger.debug(f"Found {len(tree['_root_files']['files'])} root files")
-        for file_obj in tree["_root_files"]["files"]:
-            file_key = file_obj['key']
-            file_size = format_size(file_obj['size'])
-            filename = os.path.basename(file_key)
-            html += f'<li class="file"><a href="/download/{file_key}">{filename}</a><span class="file-size">({file_size})</span></li>'
+    if files:
+        logger.debug("Found %d root files", len(files))
+        out.extend(map(render_file, files))
     
     # Process folders
-    for folder_name, content in sorted(tree.items()):
-        if folder_name == "_root_files":
-            continue
-            
+    for folder_name, content in folders.items():
         folder_path = f"{parent_path}/{folder_name}" if parent_path else folder_name
-        logger.debug(f"Processing folder: {folder_path}")
-        folder_id = f"folder_{prefix}_{folder_name}_{level}".replace('/', '_').replace(' ', '_')
-        dropdown_id = f"dropdown_{prefix}_{folder_name}_{level}".replace('/', '_').replace(' ', '_')
-        
-        html += f'<li class="folder">'
-        html += f'<div class="folder-header">'
-        html += f'<span class="folder-name" onclick="toggleFolder(\'{folder_id}\')">{folder_name}</span>'
-        
-        # Three-dot menu
-        html += f'<div class="three-dot-menu">'
-        html += f'<button class="three-dot-btn" onclick="toggleDropdown(\'{dropdown_id}\', event)">⋮</button>'
-        html += f'<div id="{dropdown_id}" class="dropdown-menu">'
-        html += f'<a class="dropdown-item" onclick="downloadFolder(\'{folder_path}\', event)">📥 Download</a>'
-        html += f'<a class="dropdown-item" onclick="showFolderInfo(\'{folder_path}\', event)">ℹ️ Info</a>'
-        html += f'</div>'
-        html += f'</div>'
-        
-        html += f'</div>'
-        html += f'<div id="{folder_id}" class="collapsible">'
+        logger.debug("Processing folder: %s", folder_path)
+        id_suffix = f"_{prefix}_{folder_name}_{level}".translate(_ID_TRANS)
+        folder_id = "folder" + id_suffix
+        dropdown_id = "dropdown" + id_suffix
+        
+        out.append(_FOLDER_OPEN_TMPL.format(
+            fid=escape(folder_id),
+            fid_js=js_arg(folder_id),
+            did=escape(dropdown_id),
+            did_js=js_arg(dropdown_id),
+            fn=escape(folder_name),
+            fp_js=js_arg(folder_path)
+        ))
         
         # Render files in this folder
-        if "files" in content:
-            logger.debug(f"Folder {folder_path} contains {len(content['files'])} files")
-            html += "<ul>"
-            for file_obj in sorted(content["files"], key=lambda x: x['key']):
-                file_key = file_obj['key']
-                file_size = format_size(file_obj['size'])
-                filename = os.path.basename(file_key)
-                html += f'<li class="file"><a href="/download/{file_key}">{filename}</a><span class="file-size">({file_size})</span></li>'
-            html += "</ul>"
+        logger.debug("Folder %s contains %d files", folder_path, len(content['files']))
+        out.append("<ul>")
+        out.extend(map(render_file, content["files"]))
+        out.append("</ul>")
         
         # Recursively render subfolders
-        if "folders" in content and content["folders"]:
-            logger.debug(f"Folder {folder_path} contains {len(content['folders'])} subfolders")
-            html += render_tree(content["folders"], f"{prefix}_{folder_name}", level + 1, folder_path)
+        if content["folders"]:
+            logger.debug("Folder %s contains %d subfolders", folder_path, len(content['folders']))
+            _render_tree(content["folders"], out, f"{prefix}_{folder_name}", level + 1, folder_path)
         
-        html += "</div>"
-        html += "</li>"
+        out.append(_FOLDER_CLOSE)
     
-    html += "</ul>"
-    return html
+    out.append("</ul>")
+
+def cached_tree():
+    """Return the cached tree entry if it is within the TTL"""
+    if _INDEX_CACHE['html'] is not None and time.time() - _INDEX_CACHE['ts'] < _CACHE_TTL:
+        return _INDEX_CACHE
+    return None
+
+def _janitor():
+    """Background loop that drops expired download tasks and releases their zip buffers"""
+    while True:
+        now = time.time()
+        try:
+            with download_tasks_lock:
+                # Releases tasks past the cache TTL, then those past their own expiry
+                download_tasks.expire()
+                expired = [tid for tid, t in list(download_tasks.items()) if t.get('expires_at', float('inf')) <= now]
+                for tid in expired:
+                    task = download_tasks.pop(tid, None)
+                    if task is not None:
+                        release_task(tid, task)
+        except Exception:
+            # Keep the only cleanup thread alive; the next pass retries
+            logger.exception("Download janitor pass failed")
+        time.sleep(JANITOR_INTERVAL)
+
+threading.Thread(target=_janitor, name="download-janitor", daemon=True).start()
 
 @app.route("/")
 def index():
     logger.info("Index route accessed - rendering initial page")
     return render_template('index.html', bucket=bucket, title=title)
 
+def stream_tree():
+    """Yield SSE frames while listing the bucket page by page, caching the final tree"""
+    tree = {"files": [], "folders": {}}
+    count = 0
+    paginator = s3.get_paginator('list_objects_v2')
+    
+    for page_count, objs in enumerate(paginator.paginate(Bucket=bucket, PaginationConfig={'PageSize': 1000}), 1):
+        page_contents = objs.get("Contents", [])
+        count += len(page_contents)
+        logger.info(f"Page {page_count}: Found {len(page_contents)} objects (Total so far: {count})")
+        
+        # Grow the tree with this page only, instead of rebuilding it from every object so far
+        add_to_tree(tree, page_contents)
+        
+        is_complete = not objs.get('IsTruncated', False)
+        
+        # Re-render intermediate trees on pages 1, 2, 4, 8, ... so total render work stays linear
+        if not is_complete and page_count & (page_count - 1):
+            continue
+        
+        # Listings arrive nearly sorted, so this is close to a linear pass
+        sort_tree(tree)
+        tree_html = render_tree(tree)
+        
+        # Send update with current tree and status
+        yield f"data: {dumps({'status': 'progress' if not is_complete else 'complete', 'tree': tree_html, 'count': count, 'page': page_count})}\n\n"
+        
+        if is_complete:
+            logger.info(f"Completed loading {count} total objects")
+            with _INDEX_CACHE_LOCK:
+                _INDEX_CACHE.update(html=tree_html, count=count, page=page_count, ts=time.time())
+
+class TreeBuild:
+    """A bucket listing running on a background thread; any number of clients can follow its SSE frames"""
+
+    def __init__(self):
+        self.frames = []
+        self.done = False
+        self.cond = threading.Condition()
+
+    def run(self):
+        """Produce frames from stream_tree, independent of how fast any client reads them"""
+        try:
+            for frame in stream_tree():
+                self.publish(frame)
+        except Exception as e:
+            logger.error(f"Error in progressive tree loading: {str(e)}", exc_info=True)
+            self.publish(f"data: {dumps({'status': 'error', 'message': str(e)})}\n\n")
+        finally:
+            with _INDEX_CACHE_LOCK:
+                _INDEX_CACHE['build'] = None
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def publish(self, frame):
+        with self.cond:
+            self.frames.append(frame)
+            self.cond.notify_all()
+
+    def follow(self):
+        """Yield frames as they are published, starting from the latest one (older trees are superseded)"""
+        with self.cond:
+            i = max(len(self.frames) - 1, 0)
+        while True:
+            with self.cond:
+                while i >= len(self.frames) and not self.done:
+                    self.cond.wait()
+                frames = self.frames[i:]
+                done = self.done
+            i += len(frames)
+            yield from frames
+            if done:
+                return
+
 @app.route("/load-tree")
 def load_tree():
     """Stream tree data progressively as pages are fetched"""
@@ -158,44 +468,26 @@ def load_tree():
         try:
             logger.info(f"Starting progressive tree loading for bucket: {bucket}")
             
-            contents = []
-            continuation_token = None
-            page_count = 0
+            # Coalesce concurrent rebuilds: every client follows the same in-flight build
+            with _INDEX_CACHE_LOCK:
+                cached = cached_tree()
+                build = None
+                if cached is None:
+                    build = _INDEX_CACHE['build']
+                    if build is None:
+                        build = _INDEX_CACHE['build'] = TreeBuild()
+                        threading.Thread(target=build.run, name="tree-build", daemon=True).start()
             
-            while True:
-                page_count += 1
-                logger.info(f"Fetching page {page_count} for bucket listing")
-                
-                if continuation_token:
-                    objs = s3.list_objects_v2(
-                        Bucket=bucket,
-                        ContinuationToken=continuation_token
-                    )
-                else:
-                    objs = s3.list_objects_v2(Bucket=bucket)
-                
-                page_contents = objs.get("Contents", [])
-                contents.extend(page_contents)
-                logger.info(f"Page {page_count}: Found {len(page_contents)} objects (Total so far: {len(contents)})")
-                
-                # Build tree with current data
-                tree = build_tree(contents)
-                tree_html = render_tree(tree)
-                
-                # Send update with current tree and status
-                is_complete = not objs.get('IsTruncated', False)
-                
-                yield f"data: {json.dumps({'status': 'progress' if not is_complete else 'complete', 'tree': tree_html, 'count': len(contents), 'page': page_count})}\n\n"
-                
-                if is_complete:
-                    logger.info(f"Completed loading {len(contents)} total objects")
-                    break
-                
-                continuation_token = objs.get('NextContinuationToken')
+            if build is not None:
+                yield from build.follow()
+                return
+            
+            logger.info(f"Serving cached tree ({cached['count']} objects)")
+            yield f"data: {dumps({'status': 'complete', 'tree': cached['html'], 'count': cached['count'], 'page': cached['page']})}\n\n"
                 
         except Exception as e:
             logger.error(f"Error in progressive tree loading: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+            yield f"data: {dumps({'status': 'error', 'message': str(e)})}\n\n"
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
@@ -205,10 +497,21 @@ def download(keyname):
     try:
         logger.info(f"Fetching object from S3: {keyname}")
         file_obj = s3.get_object(Bucket=bucket, Key=keyname)
-        data = file_obj['Body'].read()
+        body = file_obj['Body']
         filename = os.path.basename(keyname)
-        logger.info(f"Successfully downloaded file: {filename} (size: {len(data)} bytes)")
-        return send_file(BytesIO(data), as_attachment=True, download_name=filename)
+        
+        def generate():
+            # Relay the S3 body chunk by chunk and release the connection when done
+            with body:
+                yield from body.iter_chunks(chunk_size=COPY_CHUNK_SIZE)
+            logger.info(f"Successfully streamed file: {filename} (size: {file_obj['ContentLength']} bytes)")
+        
+        headers = {
+            'Content-Disposition': content_disposition(filename),
+            'Content-Length': str(file_obj['ContentLength']),
+            'Content-Type': file_obj.get('ContentType', 'application/octet-stream'),
+        }
+        return Response(stream_with_context(generate()), headers=headers)
     except Exception as e:
         logger.error(f"Error downloading file {keyname}: {str(e)}", exc_info=True)
         return f"Error downloading file: {str(e)}", 500
@@ -221,60 +524,30 @@ def folder_info(folder_path):
         if not folder_path.endswith('/'):
             folder_path += '/'
         
-        logger.info(f"Fetching info for folder: {folder_path}")
+        with folder_cache_lock:
+            info = folder_info_cache.get(folder_path)
+        if info is not None:
+            logger.info(f"Serving cached folder info for {folder_path}")
+            return jsonify(info)
         
-        # List all objects in the folder using pagination
-        objects = []
-        continuation_token = None
+        logger.info(f"Fetching info for folder: {folder_path}")
         
-        while True:
-            if continuation_token:
-                response = s3.list_objects_v2(
-                    Bucket=bucket, 
-                    Prefix=folder_path,
-                    ContinuationToken=continuation_token
-                )
-            else:
-                response = s3.list_objects_v2(Bucket=bucket, Prefix=folder_path)
-            
-            page_objects = response.get('Contents', [])
-            objects.extend(page_objects)
-            
-            if response.get('IsTruncated'):
-                continuation_token = response.get('NextContinuationToken')
-            else:
-                break
+        paginator = s3.get_paginator('list_objects_v2')
         
-        # Calculate statistics
+        # One recursive listing, summed as it streams: totals include everything, subfolders are distinct first segments
+        total_files = 0
         total_size = 0
-        file_count = 0
         subfolders = set()
-        
-        for obj in objects:
-            key = obj['Key']
-            
-            # Skip the folder itself
-            if key == folder_path:
-                continue
-            
-            # Count files and size
-            total_size += obj['Size']
-            
-            # Get relative path
-            relative_path = key[len(folder_path):]
-            
-            # Check if it's a direct file or in a subfolder
-            if '/' in relative_path:
-                # It's in a subfolder
-                subfolder = relative_path.split('/')[0]
-                subfolders.add(subfolder)
-            else:
-                # It's a direct file
-                if relative_path:  # Not empty
-                    file_count += 1
-        
-        # Total files includes all files recursively
-        total_files = len(objects) if len(objects) > 0 else 0  # Exclude folder itself
+        for page in paginator.paginate(Bucket=bucket, Prefix=folder_path, PaginationConfig={'PageSize': 1000}):
+            for obj in page.get('Contents', ()):
+                total_files += 1
+                # Skip the folder itself when summing sizes
+                if obj['Key'] == folder_path:
+                    continue
+                total_size += obj['Size']
+                subfolder, sep, _ = obj['Key'][len(folder_path):].partition('/')
+                if sep:
+                    subfolders.add(subfolder)
         
         info = {
             'path': folder_path.rstrip('/'),
@@ -284,6 +557,9 @@ def folder_info(folder_path):
             'subfolder_count': len(subfolders)
         }
         
+        with folder_cache_lock:
+            folder_info_cache[folder_path] = info
+        
         logger.info(f"Folder info for {folder_path}: {info}")
         return jsonify(info)
         
@@ -297,6 +573,7 @@ def download_folder_progress(folder_path):
     task_id = request.args.get('task_id', 'unknown')
     
     def generate():
+        task = None
         try:
             # Normalize folder path
             if not folder_path.endswith('/'):
@@ -307,97 +584,108 @@ def download_folder_progress(folder_path):
             logger.info(f"[{task_id}] Starting folder download with progress: {folder_path_normalized}")
             
             # List all objects in the folder using pagination
-            objects = []
-            continuation_token = None
-            page_count = 0
-            
-            while True:
-                page_count += 1
-                if continuation_token:
-                    response = s3.list_objects_v2(
-                        Bucket=bucket, 
-                        Prefix=folder_path_normalized,
-                        ContinuationToken=continuation_token
-                    )
-                else:
-                    response = s3.list_objects_v2(Bucket=bucket, Prefix=folder_path_normalized)
-                
-                page_objects = response.get('Contents', [])
-                objects.extend(page_objects)
-                
-                if response.get('IsTruncated'):
-                    continuation_token = response.get('NextContinuationToken')
-                else:
-                    break
+            objects = list_objects(folder_path_normalized)
             
             logger.info(f"[{task_id}] Total objects found: {len(objects)}")
             
             if len(objects) == 0:
-                yield f"data: {json.dumps({'status': 'error', 'message': 'No files found in folder'})}\n\n"
+                yield f"data: {dumps({'status': 'error', 'message': 'No files found in folder'})}\n\n"
                 return
             
-            # Initialize task state
-            download_tasks[task_id] = {'cancelled': False, 'zip_buffer': None}
+            folder_name = os.path.basename(folder_path.rstrip('/'))
+            token = listing_token(objects)
+            
+            # Reuse the previous zip if nothing in the folder changed since it was built
+            with folder_cache_lock:
+                cached = zip_cache.get(folder_path_normalized)
+            if cached is not None and cached['token'] == token:
+                logger.info(f"[{task_id}] Serving cached zip with {cached['file_count']} files")
+                with download_tasks_lock:
+                    download_tasks[task_id] = {
+                        'cancelled': False,
+                        'zip_buffer': BytesIO(cached['data']),
+                        'folder_name': folder_name
+                    }
+                yield f"data: {dumps({'status': 'complete', 'file_count': cached['file_count']})}\n\n"
+                return
+            
+            # Initialize task state; it moves to download_tasks once the zip is ready
+            task = {'cancelled': False, 'zip_buffer': None}
+            with download_tasks_lock:
+                active_tasks[task_id] = task
             
             # Create zip file
-            zip_buffer = BytesIO()
+            zip_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
             file_count = 0
             total_bytes = 0
             
-            compression = zipfile.ZIP_STORED if len(objects) > 100 else zipfile.ZIP_DEFLATED
+            # Fetch objects through a bounded prefetch window; zip writes stay on this thread since ZipFile is not thread-safe
+            keys = [obj['Key'] for obj in objects if obj['Key'] != folder_path_normalized]
             
-            with zipfile.ZipFile(zip_buffer, 'w', compression) as zip_file:
-                for idx, obj in enumerate(objects, 1):
+            with closing(fetch_objects(keys)) as fetched, open_zip(zip_buffer) as zip_file:
+                for idx, (key, future) in enumerate(fetched, 1):
                     # Check if cancelled
-                    if download_tasks.get(task_id, {}).get('cancelled', False):
+                    if task['cancelled']:
                         logger.info(f"[{task_id}] Download cancelled by user")
-                        yield f"data: {json.dumps({'status': 'cancelled'})}\n\n"
+                        yield f"data: {dumps({'status': 'cancelled'})}\n\n"
                         return
                     
-                    key = obj['Key']
-                    
-                    if key == folder_path_normalized:
-                        continue
-                    
-                    logger.info(f"Processing file {idx}/{len(objects)}: {key}")
+                    logger.info("[%s] Processing file %d/%d: %s", task_id, idx, len(keys), key)
                     
                     try:
-                        file_obj = s3.get_object(Bucket=bucket, Key=key)
-                        file_data = file_obj['Body'].read()
+                        spool = future.result()
                         
                         relative_path = key[len(folder_path_normalized):]
                         if relative_path:
-                            zip_file.writestr(relative_path, file_data)
+                            total_bytes += write_zip_entry(zip_file, relative_path, spool)
                             file_count += 1
-                            total_bytes += len(file_data)
                             
-                            # Send progress update
-                            yield f"data: {json.dumps({'status': 'progress', 'current': file_count, 'total': len(objects)})}\n\n"
+                            # Send progress update (throttled; the browser cannot paint every file anyway)
+                            if file_count % PROGRESS_EVERY == 0 or idx == len(keys):
+                                yield f"data: {dumps({'status': 'progress', 'current': file_count, 'total': len(objects)})}\n\n"
                     
                     except Exception as e:
                         logger.error(f"[{task_id}] Error processing file {key}: {str(e)}")
                         continue
             
             # Check if cancelled after completion
-            if download_tasks.get(task_id, {}).get('cancelled', False):
+            if task['cancelled']:
                 logger.info(f"[{task_id}] Download cancelled after zip creation")
-                yield f"data: {json.dumps({'status': 'cancelled'})}\n\n"
+                yield f"data: {dumps({'status': 'cancelled'})}\n\n"
                 return
             
+            zip_size = zip_buffer.tell()
             zip_buffer.seek(0)
             
-            # Store zip buffer in task
-            download_tasks[task_id]['zip_buffer'] = zip_buffer
-            download_tasks[task_id]['folder_name'] = os.path.basename(folder_path.rstrip('/'))
+            # Cache complete zips that stayed in memory; the task gets its own reader over the same bytes
+            if file_count == len(keys) and zip_size <= ZIP_SPOOL_SIZE:
+                data = zip_buffer.read()
+                zip_buffer.close()
+                zip_buffer = BytesIO(data)
+                with folder_cache_lock:
+                    zip_cache[folder_path_normalized] = {'token': token, 'data': data, 'file_count': file_count}
+            
+            # Store zip buffer in task and hand it over to the bounded cache
+            with download_tasks_lock:
+                task['zip_buffer'] = zip_buffer
+                task['folder_name'] = folder_name
+                download_tasks[task_id] = task
+                del active_tasks[task_id]
             
             logger.info(f"[{task_id}] Zip file created successfully with {file_count} files")
             
             # Send completion
-            yield f"data: {json.dumps({'status': 'complete', 'file_count': file_count})}\n\n"
+            yield f"data: {dumps({'status': 'complete', 'file_count': file_count})}\n\n"
             
         except Exception as e:
             logger.error(f"[{task_id}] Error in download progress: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+            yield f"data: {dumps({'status': 'error', 'message': str(e)})}\n\n"
+        
+        finally:
+            # Cancelled, failed or disconnected builds stop being tracked
+            with download_tasks_lock:
+                if task is not None and active_tasks.get(task_id) is task:
+                    del active_tasks[task_id]
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
@@ -406,39 +694,47 @@ def get_zip(task_id):
     """Download the generated zip file"""
     logger.info(f"[{task_id}] Zip download requested")
     
-    if task_id not in download_tasks:
-        return "Download not found or expired", 404
-    
-    task = download_tasks[task_id]
-    zip_buffer = task.get('zip_buffer')
-    folder_name = task.get('folder_name', 'download')
-    
-    if not zip_buffer:
-        return "Download not ready", 404
+    with download_tasks_lock:
+        if task_id in active_tasks:
+            return "Download not ready", 404
+        
+        task = download_tasks.get(task_id)
+        if task is None or task.get('served'):
+            return "Download not found or expired", 404
+        
+        zip_buffer = task.get('zip_buffer')
+        folder_name = task.get('folder_name', 'download')
+        
+        if not zip_buffer:
+            return "Download not ready", 404
+        
+        # send_file takes ownership of the buffer and closes it once the response is sent
+        task['zip_buffer'] = None
+        task['served'] = True
+        # Let the janitor clean up the task after a delay
+        task['expires_at'] = time.time() + TASK_EXPIRY_SECONDS
     
-    # Create a copy of the buffer for sending
-    zip_data = BytesIO(zip_buffer.getvalue())
+    zip_size = zip_buffer.seek(0, os.SEEK_END)
+    zip_buffer.seek(0)
     zip_filename = f"{folder_name}.zip"
     
-    # Clean up task after a delay (in a background thread)
-    def cleanup():
-        import time
-        time.sleep(60)  # Keep for 1 minute
-        if task_id in download_tasks:
-            del download_tasks[task_id]
-            logger.info(f"[{task_id}] Task cleaned up")
-    
-    threading.Thread(target=cleanup, daemon=True).start()
-    
-    return send_file(zip_data, as_attachment=True, download_name=zip_filename, mimetype='application/zip')
+    # Stream the spooled buffer directly instead of copying it
+    response = send_file(zip_buffer, as_attachment=True, download_name=zip_filename, mimetype='application/zip')
+    response.content_length = zip_size
+    return response
 
 @app.route("/cancel-download/<task_id>", methods=['POST'])
 def cancel_download(task_id):
     """Cancel an ongoing download"""
     logger.info(f"[{task_id}] Cancel requested")
     
-    if task_id in download_tasks:
-        download_tasks[task_id]['cancelled'] = True
+    with download_tasks_lock:
+        task = active_tasks.get(task_id) or download_tasks.get(task_id)
+        if task is not None:
+            task['cancelled'] = True
+            task['expires_at'] = time.time() + TASK_EXPIRY_SECONDS
+    
+    if task is not None:
         return jsonify({'status': 'cancelled'})
     else:
         return jsonify({'status': 'not_found'}), 404
@@ -455,33 +751,7 @@ def download_folder(folder_path):
         logger.info(f"Listing objects in folder: {folder_path}")
         
         # List all objects in the folder using pagination for large folders
-        objects = []
-        continuation_token = None
-        page_count = 0
-        
-        while True:
-            page_count += 1
-            logger.info(f"Fetching page {page_count} for folder listing")
-            
-            if continuation_token:
-                response = s3.list_objects_v2(
-                    Bucket=bucket, 
-                    Prefix=folder_path,
-                    ContinuationToken=continuation_token
-                )
-            else:
-                response = s3.list_objects_v2(Bucket=bucket, Prefix=folder_path)
-            
-            page_objects = response.get('Contents', [])
-            objects.extend(page_objects)
-            logger.info(f"Page {page_count}: Found {len(page_objects)} objects (Total so far: {len(objects)})")
-            
-            # Check if there are more pages
-            if response.get('IsTruncated'):
-                continuation_token = response.get('NextContinuationToken')
-                logger.info(f"More pages available, continuing with token: {continuation_token[:20]}...")
-            else:
-                break
+        objects = list_objects(folder_path)
         
         logger.info(f"Total objects found in folder {folder_path}: {len(objects)}")
         
@@ -489,63 +759,49 @@ def download_folder(folder_path):
             logger.warning(f"No objects found in folder {folder_path}")
             return "No files found in this folder", 404
         
-        # Create a zip file in memory with optimized settings
-        logger.info("Creating zip file in memory")
-        zip_buffer = BytesIO()
+        # Create a zip file in a spooled buffer (memory first, disk once it grows large)
+        logger.info("Creating zip file")
+        zip_buffer = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
         file_count = 0
         total_bytes = 0
         
-        # Use ZIP_STORED for faster processing on large folders (no compression)
-        # Switch to ZIP_DEFLATED for smaller folders
-        compression = zipfile.ZIP_STORED if len(objects) > 100 else zipfile.ZIP_DEFLATED
-        logger.info(f"Using compression mode: {'STORED (no compression)' if compression == zipfile.ZIP_STORED else 'DEFLATED'}")
+        # Compression is chosen per entry by file extension (see write_zip_entry)
         
-        with zipfile.ZipFile(zip_buffer, 'w', compression) as zip_file:
-            for idx, obj in enumerate(objects, 1):
-                key = obj['Key']
-                
-                # Skip if it's just the folder itself
-                if key == folder_path:
-                    continue
-                
-                # Log progress every 10 files or for first/last file
-                if idx == 1 or idx % 10 == 0 or idx == len(objects):
-                    logger.info(f"Processing file {idx}/{len(objects)}: {key}")
-                else:
-                    logger.debug(f"Processing file {idx}/{len(objects)}: {key}")
+        # Fetch objects through a bounded prefetch window; zip writes stay on this thread since ZipFile is not thread-safe
+        keys = [obj['Key'] for obj in objects if obj['Key'] != folder_path]  # Skip if it's just the folder itself
+        
+        with closing(fetch_objects(keys)) as fetched, open_zip(zip_buffer) as zip_file:
+            for idx, (key, future) in enumerate(fetched, 1):
+                # Log progress at INFO every 10 files or for first/last file
+                level = logging.INFO if idx == 1 or idx % 10 == 0 or idx == len(keys) else logging.DEBUG
+                logger.log(level, "Processing file %d/%d: %s", idx, len(keys), key)
                 
                 try:
-                    # Download the file from S3
-                    file_obj = s3.get_object(Bucket=bucket, Key=key)
-                    file_data = file_obj['Body'].read()
+                    spool = future.result()
                     
                     # Add to zip with relative path
                     relative_path = key[len(folder_path):]
                     if relative_path:  # Only add if not empty
-                        zip_file.writestr(relative_path, file_data)
+                        total_bytes += write_zip_entry(zip_file, relative_path, spool)
                         file_count += 1
-                        total_bytes += len(file_data)
                         
-                        if idx % 10 == 0:
-                            logger.info(f"Progress: {file_count} files added, {format_size(total_bytes)} total")
+                        if idx % 10 == 0 and logger.isEnabledFor(logging.INFO):
+                            logger.info("Progress: %d files added, %s total", file_count, format_size(total_bytes))
                         
                 except Exception as e:
                     logger.error(f"Error processing file {key}: {str(e)}")
                     # Continue with other files even if one fails
                     continue
         
+        # The buffer position after closing the archive is its size; no need to touch the data
+        zip_size = zip_buffer.tell()
         zip_buffer.seek(0)
-        zip_size = zip_buffer.getbuffer().nbytes
         
         # Get folder name for the zip file
         folder_name = os.path.basename(folder_path.rstrip('/'))
         zip_filename = f"{folder_name}.zip"
         
-        logger.info(f"Successfully created zip file: {zip_filename}")
-        logger.info(f"  Files: {file_count}")
-        logger.info(f"  Uncompressed size: {format_size(total_bytes)}")
-        logger.info(f"  Zip size: {format_size(zip_size)}")
-        logger.info(f"  Compression ratio: {((1 - zip_size/total_bytes) * 100):.2f}%" if total_bytes > 0 else "  Compression ratio: N/A")
+        logger.info("Created zip file %s: files=%d uncompressed=%d zip=%d", zip_filename, file_count, total_bytes, zip_size)
         
         return send_file(zip_buffer, as_attachment=True, download_name=zip_filename, mimetype='application/zip')
         